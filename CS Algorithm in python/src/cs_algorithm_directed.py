@@ -16,6 +16,7 @@ def main() 内の設定項目を編集して実行してください。
 - 分析結果のJSONファイル
 """
 
+import numpy as np
 import pandas as pd
 import pingouin as pg
 from itertools import combinations
@@ -23,6 +24,9 @@ from collections import defaultdict
 import networkx as nx
 import traceback
 import json
+import time
+import math
+import zipfile
 
 # --- ヘルパー関数 ---
 
@@ -38,77 +42,242 @@ def get_v_structure_tuples(directed_edges: set):
                 v_structures.add(tuple(sorted((x,y))) + (z,))
     return v_structures
 
+def compute_pairwise_complete_stats(df: pd.DataFrame):
+    """
+    欠損値を含むデータから、ペアワイズ完全（検定ごとの削除）な相関行列と有効サンプル数行列を一括計算する。
+    欠損マスクを使った行列積のみで計算し、行単位の除外は行わない。
+    """
+    X = df.to_numpy(dtype=float)
+    observed = ~np.isnan(X)
+    M = observed.astype(float)
+    # 平均が散らばりに比べて大きい列で桁落ちしないよう、列ごとの観測値の平均で中心化してから積率を取る
+    col_means = np.nanmean(np.where(observed.any(axis=0), X, 0.0), axis=0)
+    Xz = np.where(observed, X - col_means, 0.0)
+
+    n = M.T @ M                      # n[i, j]: 変数i, jがともに観測されている行数
+    sum_i = Xz.T @ M                 # sum_i[i, j]: i, jがともに観測されている行でのiの和
+    sumsq_i = (Xz ** 2).T @ M
+    sum_ij = Xz.T @ Xz
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_ij - sum_i * sum_i.T / n
+        var_i = sumsq_i - sum_i ** 2 / n
+        corr = cov / np.sqrt(var_i * var_i.T)
+    np.fill_diagonal(corr, 1.0)
+    return {'index': {c: i for i, c in enumerate(df.columns)}, 'corr': corr, 'n': n}
+
+def fisher_z_test(pc_stats: dict, x: str, y: str, covar: list):
+    """
+    ペアワイズ完全な相関行列から偏相関係数を求め、Fisherのz変換で検定する。
+    有効サンプル数には、検定に関わる変数ペアの有効サンプル数の最小値を用いる。
+    検定できない場合（有効サンプル数不足、相関行列の部分行列が半正定値でない場合、|r| が1以上の場合）のp値は NaN を返す。
+
+    Returns:
+        (偏相関係数, p値, 有効サンプル数)
+    """
+    idx = [pc_stats['index'][v] for v in [x, y] + list(covar)]
+    sub = pc_stats['corr'][np.ix_(idx, idx)]
+    n_eff = int(pc_stats['n'][np.ix_(idx, idx)].min())
+    if np.isnan(sub).any():
+        return float('nan'), float('nan'), n_eff
+    # ペアワイズ完全な相関行列は半正定値とは限らない。負の固有値を持つ部分行列からの偏相関係数は
+    # 意味を持たず、|r| が1以上になって極端に小さいp値を生むため、検定不能として扱う
+    if covar and np.linalg.eigvalsh(sub).min() < -1e-10:
+        return float('nan'), float('nan'), n_eff
+    if covar:
+        prec = np.linalg.pinv(sub)
+        if prec[0, 0] * prec[1, 1] <= 0:
+            return float('nan'), float('nan'), n_eff
+        r = -prec[0, 1] / math.sqrt(prec[0, 0] * prec[1, 1])
+    else:
+        r = sub[0, 1]
+    if not abs(r) < 1:
+        return float('nan'), float('nan'), n_eff
+    dof = n_eff - len(covar) - 3
+    if dof <= 0:
+        return r, float('nan'), n_eff
+    z = math.atanh(r) * math.sqrt(dof)
+    return r, math.erfc(abs(z) / math.sqrt(2)), n_eff
+
+def deadline_passed(deadline: float):
+    """deadline（time.monotonic() 基準の時刻）を過ぎたかどうか。None の場合は常に False"""
+    return deadline is not None and time.monotonic() >= deadline
+
 # --- フェーズ1：骨格発見 ---
 
-def discover_skeleton(df: pd.DataFrame, alpha: float, max_control_vars: int):
-    """CSアルゴリズムに基づき、グラフの骨格と、向き付けに必要な分離集合・p値を発見する"""
+def discover_skeleton(df: pd.DataFrame, alpha: float, max_control_vars: int, deadline: float = None, max_ci_tests: int = None, pc_stats: dict = None):
+    """
+    CSアルゴリズムに基づき、グラフの骨格と、向き付けに必要な分離集合・p値を発見する。
+
+    deadline（time.monotonic() 基準の時刻）または max_ci_tests（条件付き独立性検定の最大回数）が
+    指定された場合は予算付きモードで動作し、関連の弱い辺（これまでの最大p値が大きい辺）から優先的に検定する。
+    予算を使い切った時点で探索を打ち切り、その時点の骨格を返す。
+    0次の検定は一括計算のため常に実行し、辺の数だけ検定回数に計上する。
+    pc_stats（compute_pairwise_complete_stats の結果）が指定された場合は、欠損値対応のFisherのz検定を用いる。
+
+    Returns:
+        G, sepsets, sepset_pvals, search_status
+        search_status は検定回数・経過時間・予算切れの有無・検定未完了の辺の集合を持つ辞書。
+    """
     print("\n--- [フェーズ1] グラフ骨格の発見 ---")
     variables = list(df.columns)
     G = nx.complete_graph(variables)
     sepsets = defaultdict(list)
     sepset_pvals = {}
+    budgeted = deadline is not None or max_ci_tests is not None
+    start_time = time.monotonic()
+    ci_tests = 0
+    edge_pvals = {}  # 辺ごとのこれまでの最大p値（検定できずNaNとなった結果は記録しない）
+    nan_tested_pairs = set()
+
+    def _log_untestable(x, y, s, n_eff):
+        # 有効サンプル数不足などで検定できなかったペアは独立と判定されず辺が残るため、ペアごとに一度だけ記録する
+        key = tuple(sorted((x, y)))
+        if key in nan_tested_pairs: return
+        nan_tested_pairs.add(key)
+        print(f"  - [検定不能] {x} - {y} | {s} (有効サンプル数={n_eff})")
+
+    def _budget_exhausted():
+        if max_ci_tests is not None and ci_tests >= max_ci_tests: return True
+        if deadline is not None and time.monotonic() >= deadline: return True
+        return False
 
     initial_edges = G.number_of_edges()
     print(f"  - 分析開始時のグラフ: 完全グラフ (辺の数: {initial_edges})")
+    if budgeted:
+        print(f"  - 予算付きモード: 残り時間 {f'{deadline - start_time:.1f}秒' if deadline is not None else '無制限'} | 最大検定回数 {max_ci_tests if max_ci_tests is not None else '無制限'}")
 
     print("\n[ステップ1.1] 0次の独立性検定")
     edges_before = G.number_of_edges()
-    pairwise_results = pg.pairwise_corr(df, method='pearson')
-    for _, row in pairwise_results.iterrows():
-        x, y, p_val = row['X'], row['Y'], row['p-unc']
+    if pc_stats is None:
+        pairwise_results = pg.pairwise_corr(df, method='pearson')
+        pairwise_iter = ((row['X'], row['Y'], row['p-unc']) for _, row in pairwise_results.iterrows())
+    else:
+        pairwise_results = list(combinations(variables, 2))
+        pairwise_iter = ((x, y, fisher_z_test(pc_stats, x, y, [])[1]) for x, y in pairwise_results)
+    for x, y, p_val in pairwise_iter:
+        key = tuple(sorted((x, y)))
+        if not math.isnan(p_val): edge_pvals[key] = p_val
+        else: _log_untestable(x, y, (), int(pc_stats['n'][pc_stats['index'][x], pc_stats['index'][y]]) if pc_stats else len(df))
         if p_val > alpha:
             if G.has_edge(x,y): 
                 G.remove_edge(x, y)
                 print(f"  - [辺の削除] {x} - {y} (p={p_val:.4f})")
-            key = tuple(sorted((x, y)))
             sepsets[key].append([])
             sepset_pvals[key] = p_val
+    ci_tests += len(pairwise_results)
     edges_after = G.number_of_edges()
     print(f"  - [結果] 削除された辺の数: {edges_before - edges_after} | 残りの辺の数: {edges_after}")
 
-    temp_v_structures = find_v_structures(G, sepsets)
+    # 予算切れの場合に「検定未完了」を判定するための状態（現在の次数と、その次数で検定を終えた辺）
+    current_order, completed_in_order = 0, {tuple(sorted(e)) for e in G.edges()}
+    exhausted = budgeted and _budget_exhausted()
+
+    def _untestable_now():
+        return {tuple(sorted(e)) for e in G.edges() if tuple(sorted(e)) not in edge_pvals}
+
+    temp_v_structures = find_v_structures(G, sepsets, _untestable_now())
     for n in range(1, max_control_vars + 1):
+        if exhausted: break
         print(f"\n[ステップ1.2] {n}次の条件付き独立性検定")
         edges_before_n = G.number_of_edges()
+        current_order, completed_in_order = n, set()
 
         if temp_v_structures:
             print(f"  - 現在のV構造（MBCチェック用）: { {f'{u}->{z}<-{v}' for u,z,v in get_v_structure_tuples(temp_v_structures)} }")
 
         edges_removed_in_this_round = False
-        for x, y in sorted(list(G.edges())):
+        edges_to_check = sorted(list(G.edges()))
+        if budgeted:
+            # 関連の弱い（最大p値が大きい）辺ほど削除される見込みが高いため、先に検定する。
+            # 有効なp値が一度も得られていない辺（欠損値対応モードで検定できなかった辺）は、
+            # 高次の検定でも有効サンプル数が不足する見込みが高いため、優先度 -1 として最後に回す。
+            edges_to_check = sorted(edges_to_check, key=lambda e: -edge_pvals.get(tuple(sorted(e)), -1.0))
+        for x, y in edges_to_check:
+            key = tuple(sorted((x, y)))
             potential_S = (set(G.neighbors(x)) | set(G.neighbors(y))) - {x, y}
-            if len(potential_S) < n: continue
+            if len(potential_S) < n:
+                completed_in_order.add(key)
+                continue
             for s in combinations(potential_S, n):
                 if check_strict_mbc(G, x, y, s, temp_v_structures):
                     continue
+                if budgeted and _budget_exhausted():
+                    exhausted = True
+                    break
                 
-                pcorr = pg.partial_corr(data=df, x=x, y=y, covar=list(s))
-                p_val = pcorr['p-val'].iloc[0]
+                if pc_stats is None:
+                    pcorr = pg.partial_corr(data=df, x=x, y=y, covar=list(s))
+                    p_val, n_eff = pcorr['p-val'].iloc[0], int(pcorr['n'].iloc[0])
+                else:
+                    _, p_val, n_eff = fisher_z_test(pc_stats, x, y, list(s))
+                ci_tests += 1
+                if not math.isnan(p_val): edge_pvals[key] = max(edge_pvals.get(key, -1.0), p_val)
+                else: _log_untestable(x, y, s, n_eff)
                 if p_val > alpha:
                     print(f"  - [辺の削除] {x} - {y} | {s} (p={p_val:.4f})")
                     if G.has_edge(x,y): G.remove_edge(x, y)
-                    key = tuple(sorted((x, y))); sepsets[key].append(list(s)); sepset_pvals[key] = p_val
+                    sepsets[key].append(list(s)); sepset_pvals[key] = p_val
                     edges_removed_in_this_round = True
                     break
+            if exhausted:
+                print(f"  - [予算切れ] {n}次の検定途中で探索を打ち切ります（検定回数: {ci_tests}）")
+                break
+            completed_in_order.add(key)
         
         edges_after_n = G.number_of_edges()
         print(f"  - [結果] このステップで削除された辺の数: {edges_before_n - edges_after_n} | 残りの辺の数: {edges_after_n}")
 
         if edges_removed_in_this_round:
-            temp_v_structures = find_v_structures(G, sepsets)
-        else:
+            temp_v_structures = find_v_structures(G, sepsets, _untestable_now())
+        elif not exhausted:
             print("  - 辺の削除がなかったため、骨格発見を完了します。")
             break
+        if budgeted and not exhausted and n < max_control_vars and _budget_exhausted():
+            print(f"  - [予算切れ] {n}次の検定完了後に探索を打ち切ります（検定回数: {ci_tests}）")
+            exhausted = True
+
+    # 予算切れの場合、現在の次数の検定を終えておらず、または次の次数の検定が残っている辺を「検定未完了」とする
+    # （隣接ノードは減る一方なので、候補集合が現在の次数以下の辺にはそれ以上の検定は発生しない）
+    untested_edges = set()
+    if exhausted:
+        for x, y in G.edges():
+            key = tuple(sorted((x, y)))
+            potential_S = (set(G.neighbors(x)) | set(G.neighbors(y))) - {x, y}
+            if key not in completed_in_order or (current_order < max_control_vars and len(potential_S) > current_order):
+                untested_edges.add(key)
+
+    # 一度も有効なp値が得られなかった残存辺は、データに基づかずに残っている
+    untestable_edges = _untestable_now()
+
+    search_status = {
+        'budget_exhausted': exhausted,
+        'ci_tests': ci_tests,
+        'elapsed_sec': time.monotonic() - start_time,
+        'untested_edges': untested_edges,
+        'untestable_pairs': nan_tested_pairs,
+        'untestable_edges': untestable_edges,
+    }
     print(f"\n--- 骨格発見 完了（最終的な辺の数: {G.number_of_edges()}） ---")
-    return G, sepsets, sepset_pvals
-
-def find_v_structures(G: nx.Graph, sepsets: dict):
+    if exhausted:
+        print(f"  - 予算切れのため途中結果です（検定回数: {ci_tests}, 経過時間: {search_status['elapsed_sec']:.1f}秒, 検定未完了の辺: {len(untested_edges)}本）")
+    if nan_tested_pairs:
+        print(f"  - [検定不能] 検定できなかったペア: {len(nan_tested_pairs)}組 | うち有効なp値が一度も得られずに残った辺: {len(untestable_edges)}本")
+        if untestable_edges: print(f"    {sorted(untestable_edges)}")
+    return G, sepsets, sepset_pvals, search_status
+
+def find_v_structures(G: nx.Graph, sepsets: dict, exclude: set = None):
+    """
+    V構造を特定する。exclude に含まれる辺（有効なp値が一度も得られなかった辺）は
+    隣接関係としては残すが、データの裏付けがないためV構造の根拠には用いない。
+    """
     directed_edges = set()
     variables = list(G.nodes())
+    exclude = exclude or set()
     for x, y in combinations(variables, 2):
         if not G.has_edge(x, y):
             common_neighbors = set(G.neighbors(x)) & set(G.neighbors(y))
             for z in common_neighbors:
+                if tuple(sorted((x, z))) in exclude or tuple(sorted((y, z))) in exclude: continue
                 if not any(z in s for s in sepsets.get(tuple(sorted((x,y))), [])):
                     directed_edges.add((x, z)); directed_edges.add((y, z))
     return directed_edges
@@ -121,19 +290,28 @@ def check_strict_mbc(G: nx.Graph, x: str, y: str, s: tuple, directed_edges: set)
 
 # --- フェーズ2：向き付け ---
 
-def orient_graph(G: nx.Graph, sepsets: dict, sepset_pvals: dict, df: pd.DataFrame, alpha: float):
-    """骨格グラフに対し、向き付けのルールを適用してPDAG（部分的有向非巡回グラフ）を返す"""
+def orient_graph(G: nx.Graph, sepsets: dict, sepset_pvals: dict, df: pd.DataFrame, alpha: float, pc_stats: dict = None,
+                 untestable_edges: set = None, deadline: float = None):
+    """
+    骨格グラフに対し、向き付けのルールを適用してPDAG（部分的有向非巡回グラフ）を返す。
+    untestable_edges（有効なp値が一度も得られなかった辺）は向き付けの根拠にも対象にもせず、無向辺のまま残す。
+    deadline を過ぎた場合は、矛盾の解決・信頼できない向きの処理・論理ルールによる伝播をその時点で打ち切る。
+
+    Returns:
+        final_directed, final_undirected, orientation_complete（締め切りで打ち切られた場合は False）
+    """
     print("\n--- [フェーズ2] エッジの向き付け ---")
     
     print("\n[ステップ2.1] V構造の特定")
-    directed_edges = find_v_structures(G, sepsets)
+    directed_edges = find_v_structures(G, sepsets, untestable_edges)
     v_tuples = get_v_structure_tuples(directed_edges)
     if v_tuples: print(f"  - 発見されたV構造: { {f'{u}->{z}<-{v}' for u,z,v in v_tuples} }")
     else: print("  - V構造は見つかりませんでした。")
 
-    directed_edges = resolve_inconsistencies(directed_edges, G, sepset_pvals)
-    directed_edges = handle_unreliable_directions(directed_edges, G, df, alpha)
-    directed_edges = apply_orientation_rules(G, directed_edges)
+    directed_edges = resolve_inconsistencies(directed_edges, G, sepset_pvals, deadline)
+    directed_edges = handle_unreliable_directions(directed_edges, G, df, alpha, pc_stats, deadline)
+    directed_edges = apply_orientation_rules(G, directed_edges, untestable_edges, deadline)
+    orientation_complete = not deadline_passed(deadline)
     
     final_undirected = {tuple(sorted(e)) for e in G.edges()}
     final_directed = set()
@@ -148,12 +326,15 @@ def orient_graph(G: nx.Graph, sepsets: dict, sepset_pvals: dict, df: pd.DataFram
     final_undirected.update(processed_bidirectional)
     final_directed = {(u,v) for u,v in final_directed if tuple(sorted((u,v))) not in processed_bidirectional}
     print("\n--- 向き付け 完了 ---")
-    return final_directed, final_undirected
+    if not orientation_complete:
+        print("  - [時間切れ] 締め切りを過ぎたため、向き付けは途中結果です")
+    return final_directed, final_undirected, orientation_complete
 
-def resolve_inconsistencies(directed_edges: set, G: nx.Graph, sepset_pvals: dict):
+def resolve_inconsistencies(directed_edges: set, G: nx.Graph, sepset_pvals: dict, deadline: float = None):
     """
     矛盾する双方向エッジを、サイクルを生成しないように解決する。
     サイクルが生成される場合は、より安全な無向化を選択する。
+    deadline を過ぎた場合は打ち切り、未解決の双方向エッジは最終的に無向辺として扱われる。
     """
     bi_directional_pairs = {tuple(sorted((u, v))) for u, v in directed_edges if (v, u) in directed_edges}
     if not bi_directional_pairs:
@@ -161,6 +342,9 @@ def resolve_inconsistencies(directed_edges: set, G: nx.Graph, sepset_pvals: dict
     
     print("\n[ステップ2.2] 矛盾の解決（サイクルチェック実行）")
     for u, v in sorted(list(bi_directional_pairs)):
+        if deadline_passed(deadline):
+            print("  - [時間切れ] 締め切りを過ぎたため、残りの矛盾は解決せず無向辺として扱います")
+            break
         # このペアがまだ処理対象か再チェック（ループ内で集合が変更されるため）
         if not ((u, v) in directed_edges and (v, u) in directed_edges):
             continue
@@ -221,32 +405,47 @@ def resolve_inconsistencies(directed_edges: set, G: nx.Graph, sepset_pvals: dict
             
     return directed_edges
 
-def handle_unreliable_directions(directed_edges: set, G: nx.Graph, df: pd.DataFrame, alpha: float):
+def handle_unreliable_directions(directed_edges: set, G: nx.Graph, df: pd.DataFrame, alpha: float, pc_stats: dict = None,
+                                 deadline: float = None):
     colliders = defaultdict(list); [colliders[v].append(u) for u, v in directed_edges]
     found = False
     for z, parents in sorted(colliders.items()):
+        if deadline_passed(deadline): break
         if len(parents) < 2: continue
         for x, y in combinations(sorted(parents), 2):
             for w, w_parents in sorted(colliders.items()):
                 if w == z or x not in w_parents or y not in w_parents: continue
-                pcorr = pg.partial_corr(data=df, x=x, y=y, covar=[z])
-                if pcorr is not None and not pcorr.empty and pcorr['p-val'].iloc[0] > alpha:
+                if pc_stats is None:
+                    pcorr = pg.partial_corr(data=df, x=x, y=y, covar=[z])
+                    p_val = pcorr['p-val'].iloc[0] if pcorr is not None and not pcorr.empty else None
+                else:
+                    _, p_val, n_eff = fisher_z_test(pc_stats, x, y, [z])
+                    if math.isnan(p_val):
+                        print(f"  - [検定不能] {x} と {y} の {z} での条件付き独立性 (有効サンプル数={n_eff})。向きを維持します")
+                if p_val is not None and p_val > alpha:
                     if not found: print("\n[ステップ2.3] 信頼できない向きの処理")
                     print(f"  - [パターン発見] {x}->{z}<-{y} と {x}->{w}<-{y}")
-                    print(f"    (理由: {x}と{y}が{z}で条件付き独立 p={pcorr['p-val'].iloc[0]:.4f})")
+                    print(f"    (理由: {x}と{y}が{z}で条件付き独立 p={p_val:.4f})")
                     print(f"    - [修正] {x}->{z} と {y}->{z} の向きを削除")
                     if (x, z) in directed_edges: directed_edges.remove((x, z))
                     if (y, z) in directed_edges: directed_edges.remove((y, z))
                     found = True
     return directed_edges
 
-def apply_orientation_rules(G: nx.Graph, directed_edges: set):
+def apply_orientation_rules(G: nx.Graph, directed_edges: set, exclude: set = None, deadline: float = None):
     """
     論理ルール(R1-R4)に基づき、サイクルを生成しないように向き付けを伝播させる。
+    exclude に含まれる辺は向き付けの対象にしない。
+    deadline を過ぎた場合は伝播を打ち切り、それまでに得られた向き付けを返す（各ルールの適用結果は常に妥当）。
     Meek, C. (1995) Causal inference from graphical models.
     """
     print("\n[ステップ2.4] 論理ルールに基づく向き付けの伝播（R1-R4, サイクルチェック実行）")
     
+    exclude = exclude or set()
+
+    def _orientable(a, b):
+        return tuple(sorted((a, b))) not in exclude
+
     def _has_path(source, target, edges):
         temp_graph = nx.DiGraph()
         temp_graph.add_nodes_from(G.nodes())
@@ -258,9 +457,10 @@ def apply_orientation_rules(G: nx.Graph, directed_edges: set):
         
         # --- ルール1 (R1): X -> Y - Z (X,Zが非隣接) => Y -> Z ---
         for x, y in sorted(list(directed_edges)):
+            if deadline_passed(deadline): break
             if (y, x) in directed_edges: continue
             for z in sorted(list(G.neighbors(y))):
-                if z != x and not G.has_edge(x, z) and (y, z) not in directed_edges and (z, y) not in directed_edges:
+                if z != x and not G.has_edge(x, z) and (y, z) not in directed_edges and (z, y) not in directed_edges and _orientable(y, z):
                     if not _has_path(z, y, directed_edges):
                         print(f"  - [ルール1適用] {x} -> {y} - {z} (かつ {x},{z}は非隣接) => {y} -> {z}")
                         directed_edges.add((y, z))
@@ -270,10 +470,11 @@ def apply_orientation_rules(G: nx.Graph, directed_edges: set):
 
         # --- ルール2 (R2): X -> Y -> Z (X-Z) => X -> Z ---
         for x, y in sorted(list(directed_edges)):
+            if deadline_passed(deadline): break
             if (y, x) in directed_edges: continue
             for z in sorted(list(G.neighbors(y))):
                 if z != x and (y, z) in directed_edges and (z, y) not in directed_edges and \
-                   G.has_edge(x, z) and (x, z) not in directed_edges and (z, x) not in directed_edges:
+                   G.has_edge(x, z) and (x, z) not in directed_edges and (z, x) not in directed_edges and _orientable(x, z):
                     if not _has_path(z, x, directed_edges):
                         print(f"  - [ルール2適用] {x} -> {y} -> {z} (かつ {x}-{z}) => {x} -> {z}")
                         directed_edges.add((x, z))
@@ -289,6 +490,7 @@ def apply_orientation_rules(G: nx.Graph, directed_edges: set):
                 colliders[v].append(u)
         
         for w, parents in sorted(colliders.items()):
+            if deadline_passed(deadline): break
             if len(parents) < 2: continue
             for y, z in combinations(sorted(parents), 2):
                 # 親同士(Y,Z)が非隣接かチェック
@@ -296,7 +498,7 @@ def apply_orientation_rules(G: nx.Graph, directed_edges: set):
                     # Y,Zに共通の隣接ノードXを探す
                     common_neighbors_of_yz = set(G.neighbors(y)) & set(G.neighbors(z))
                     for x in sorted(list(common_neighbors_of_yz)):
-                        if x != w and (x, w) not in directed_edges and (w, x) not in directed_edges:
+                        if x != w and (x, w) not in directed_edges and (w, x) not in directed_edges and _orientable(x, w):
                             if not _has_path(w, x, directed_edges):
                                 print(f"  - [ルール3適用] {y}->{w}<-{z} と {y}-{x}-{z} => {x} -> {w}")
                                 directed_edges.add((x, w))
@@ -307,13 +509,14 @@ def apply_orientation_rules(G: nx.Graph, directed_edges: set):
         # --- ルール4 (R4): X->Y->Z, X-W-Z => W->Z ---
         # X->Y->Z パスを探す
         for x, y in sorted(list(directed_edges)):
+            if deadline_passed(deadline): break
             if (y, x) in directed_edges: continue
             for z_node in sorted(list(G.neighbors(y))):
                 if (y, z_node) in directed_edges and (z_node, y) not in directed_edges and x != z_node:
                     # X-W-Z パスを探す
                     common_neighbors_of_xz = (set(G.neighbors(x)) & set(G.neighbors(z_node))) - {y}
                     for w in sorted(list(common_neighbors_of_xz)):
-                        if (w, z_node) not in directed_edges and (z_node, w) not in directed_edges:
+                        if (w, z_node) not in directed_edges and (z_node, w) not in directed_edges and _orientable(w, z_node):
                             if not _has_path(z_node, w, directed_edges):
                                 print(f"  - [ルール4適用] {x}->{y}->{z_node} と {x}-{w}-{z_node} => {w} -> {z_node}")
                                 directed_edges.add((w, z_node))
@@ -321,6 +524,9 @@ def apply_orientation_rules(G: nx.Graph, directed_edges: set):
                             else:
                                 print(f"  - [ルール4 スキップ] {w} -> {z_node} はサイクルを生成するため適用しません")
 
+        if deadline_passed(deadline):
+            print("  - [時間切れ] 締め切りを過ぎたため、向き付けの伝播を打ち切ります")
+            break
         if not new_orientations_found:
             break
             
@@ -329,35 +535,79 @@ def apply_orientation_rules(G: nx.Graph, directed_edges: set):
 
 # --- フェーズ3：強さ計算と結果表示 ---
 
-def calculate_and_summarize(df: pd.DataFrame, directed_edges: set, undirected_edges: set, alpha: float, output_json_path: str):
-    """有向グラフの各辺に対し、バックドア基準で偏相関係数を計算し、結果を要約・JSON出力する"""
+def calculate_and_summarize(df: pd.DataFrame, directed_edges: set, undirected_edges: set, alpha: float, output_json_path: str, untested_edges: set = None,
+                            pc_stats: dict = None, writer: 'CompactResultWriter' = None, deadline: float = None):
+    """
+    有向グラフの各辺に対し、バックドア基準で偏相関係数を計算し、結果を要約・JSON出力する。
+    untested_edges が指定された場合（予算切れで骨格発見が打ち切られた場合）は、JSONの各辺に検定完了フラグを付けて出力する。
+    pc_stats が指定された場合（欠損値対応モード）は、ペアワイズ完全な相関行列からFisherのz検定で計算する。
+    writer が指定された場合は、有意な辺をコンパクト形式の辺テーブルへ逐次書き出す。
+    deadline を過ぎた場合は強さの計算を打ち切り、計算済みの辺だけで要約する。
+
+    Returns:
+        final_strengths, strengths_complete
+        final_strengths は計算済みの全ての辺（有意でない辺を含む）の強さのリスト。各要素は edge, strength, p_value,
+        controls, tested（検定完了フラグ。予算切れで検定が残っていた辺は False）を持つ辞書。
+        strengths_complete は締め切りで打ち切られた場合に False。
+    """
     print("\n--- [フェーズ3] パスの強さの計算と最終サマリー ---")
     print("\n[ステップ3.1] パスの強さの計算（バックドア基準）")
     parents = defaultdict(set); [parents[v].add(u) for u, v in directed_edges]
     final_strengths = []
     edges_to_process = sorted(list(directed_edges)) + sorted(list(undirected_edges))
-    for u, v in edges_to_process:
+    strengths_complete = True
+    for i, (u, v) in enumerate(edges_to_process):
+        if deadline_passed(deadline):
+            print(f"  - [時間切れ] 締め切りを過ぎたため、残り{len(edges_to_process) - i}本の辺の強さ計算を打ち切ります")
+            strengths_complete = False
+            break
         control_vars = list((parents[u] | parents[v]) - {u, v})
         try:
-            if not control_vars:
+            if pc_stats is not None:
+                strength, p_val, n_eff = fisher_z_test(pc_stats, u, v, control_vars)
+                print(f"  - {u} -- {v}: 偏相関係数 = {strength:.3f} (p={p_val:.4f}, 有効サンプル数={n_eff}), 統制変数: {control_vars if control_vars else 'なし'}")
+            elif not control_vars:
                 res = pg.corr(df[u], df[v]); strength = res['r'].iloc[0]; p_val = res['p-val'].iloc[0]
                 print(f"  - {u} -- {v}: 相関係数 = {strength:.3f} (p={p_val:.4f})")
             else:
                 res = pg.partial_corr(data=df, x=u, y=v, covar=control_vars); strength = res['r'].iloc[0]; p_val = res['p-val'].iloc[0]
                 print(f"  - {u} -- {v}: 偏相関係数 = {strength:.3f} (p={p_val:.4f}), 統制変数: {control_vars}")
-            final_strengths.append({'edge': (u, v), 'strength': strength, 'p_value': p_val, 'controls': control_vars})
+            tested = not (untested_edges and tuple(sorted((u, v))) in untested_edges)
+            final_strengths.append({'edge': (u, v), 'strength': strength, 'p_value': p_val, 'controls': control_vars, 'tested': tested})
         except Exception as e:
             print(f"  - {u} --- {v} の計算でエラー: {e}")
 
     print("\n\n--- ★★★ 分析結果の最終サマリー ★★★ ---")
+    untestable = sorted(res['edge'] for res in final_strengths if math.isnan(res['p_value']))
+    if untestable:
+        print(f"\n[検定不能のため有意性を判定できない辺: {len(untestable)}本]（有効サンプル数不足など。以下の結果には含まれません）")
+        for u, v in untestable: print(f"  - {u} -- {v}")
     results_map = {res['edge']: res for res in final_strengths if res['p_value'] < alpha}
     if not results_map: 
         print("\n統計的に有意なパスは見つかりませんでした。")
-        return
+        return final_strengths, strengths_complete
     
     bi, uni, undir = set(), set(), set(); processed_bi = set()
     json_output = []
 
+    def _untested_mark(res):
+        return "" if res['tested'] else " [検定未完了]"
+
+    def _json_record(u, arrow, v, res):
+        record = {
+            "変数1": u, "向き": arrow, "変数2": v,
+            "偏相関係数": res['strength'], "p値": res['p_value'], "統制変数群": res['controls']
+        }
+        if untested_edges is not None:
+            record["検定完了"] = res['tested']
+        return record
+
+    def _emit(u, arrow, v, res):
+        if output_json_path:
+            json_output.append(_json_record(u, arrow, v, res))
+        if writer is not None:
+            writer.add_edge(u, arrow, v, res['strength'], res['p_value'], res['controls'], res['tested'])
+
     for u, v in directed_edges:
         if (u, v) in results_map:
             if (v, u) in directed_edges:
@@ -376,11 +626,8 @@ def calculate_and_summarize(df: pd.DataFrame, directed_edges: set, undirected_ed
         for u, v in sorted(list(bi)):
             res = results_map.get((u, v)) or results_map.get((v, u))
             if res: 
-                print(f"  - {u} <--> {v} (強さ: {res['strength']:.3f}, p値: {res['p_value']:.4f}, 統制変数: {res['controls'] if res['controls'] else 'なし'})")
-                json_output.append({
-                    "変数1": u, "向き": "<-->", "変数2": v,
-                    "偏相関係数": res['strength'], "p値": res['p_value'], "統制変数群": res['controls']
-                })
+                print(f"  - {u} <--> {v} (強さ: {res['strength']:.3f}, p値: {res['p_value']:.4f}, 統制変数: {res['controls'] if res['controls'] else 'なし'}){_untested_mark(res)}")
+                _emit(u, "<-->", v, res)
     else: print("  - なし")
     # 単方向パス
     print(f"\n[単方向パス: {len(uni)}本]")
@@ -388,11 +635,8 @@ def calculate_and_summarize(df: pd.DataFrame, directed_edges: set, undirected_ed
         for u, v in sorted(list(uni)):
             res = results_map.get((u, v))
             if res: 
-                print(f"  - {u} --> {v} (強さ: {res['strength']:.3f}, p値: {res['p_value']:.4f}, 統制変数: {res['controls'] if res['controls'] else 'なし'})")
-                json_output.append({
-                    "変数1": u, "向き": "-->", "変数2": v,
-                    "偏相関係数": res['strength'], "p値": res['p_value'], "統制変数群": res['controls']
-                })
+                print(f"  - {u} --> {v} (強さ: {res['strength']:.3f}, p値: {res['p_value']:.4f}, 統制変数: {res['controls'] if res['controls'] else 'なし'}){_untested_mark(res)}")
+                _emit(u, "-->", v, res)
     else: print("  - なし")
     # 方向未決定パス
     print(f"\n[有意だが方向未決定のパス: {len(undir)}本]")
@@ -400,11 +644,8 @@ def calculate_and_summarize(df: pd.DataFrame, directed_edges: set, undirected_ed
         for u, v in sorted(list(undir)):
             res = results_map.get((u, v))
             if res: 
-                print(f"  - {u} --- {v} (強さ: {res['strength']:.3f}, p値: {res['p_value']:.4f}, 統制変数: {res['controls'] if res['controls'] else 'なし'})")
-                json_output.append({
-                    "変数1": u, "向き": "---", "変数2": v,
-                    "偏相関係数": res['strength'], "p値": res['p_value'], "統制変数群": res['controls']
-                })
+                print(f"  - {u} --- {v} (強さ: {res['strength']:.3f}, p値: {res['p_value']:.4f}, 統制変数: {res['controls'] if res['controls'] else 'なし'}){_untested_mark(res)}")
+                _emit(u, "---", v, res)
     else: print("  - なし")
 
     # --- JSONファイルへの書き出し ---
@@ -416,34 +657,259 @@ def calculate_and_summarize(df: pd.DataFrame, directed_edges: set, undirected_ed
         except Exception as e:
             print(f"\nJSONファイルへの書き出し中にエラーが発生しました: {e}")
 
+    return final_strengths, strengths_complete
+
+
+# --- 結果の保存（コンパクト形式） ---
+
+# 辺テーブルにおける向きの整数コード
+DIRECTION_CODES = {"---": 0, "-->": 1, "<-->": 2}
+
+EDGE_DTYPE = np.dtype([
+    ('u', '<i4'), ('v', '<i4'), ('direction', 'i1'), ('strength', '<f8'), ('p_value', '<f8'),
+    ('tested', '?'), ('controls_offset', '<i8'), ('controls_len', '<i4'),
+])
+SEPSET_DTYPE = np.dtype([
+    ('x', '<i4'), ('y', '<i4'), ('p_value', '<f8'), ('members_offset', '<i8'), ('members_len', '<i4'),
+])
+
+class CompactResultWriter:
+    """
+    分析結果を整数インデックスの辺テーブルとしてNumPyの .npz（zip）形式へ逐次書き出すライター。
+    変数名は variables.npy に一度だけ保存し、辺・統制変数・分離集合は変数インデックスで表す。
+    ライター自身は chunk_size 件ごとに 1 つのメンバーとして書き出し、未書き出しのチャンク分だけを保持する。
+    （呼び出し側の calculate_and_summarize は、強さの計算結果を戻り値として全件保持する。）
+
+    メンバー構成：
+    - variables.npy: 変数名の配列
+    - edges/NNNNNN.npy, edge_controls/NNNNNN.npy: 辺テーブル（EDGE_DTYPE）と、チャンク内オフセットで参照する統制変数インデックス
+    - sepsets/NNNNNN.npy, sepset_members/NNNNNN.npy: 分離集合テーブル（SEPSET_DTYPE）と、その構成変数インデックス
+    - report.json: 実行レポート（run_directed_analysis が書き出した場合、正常終了時のみ completed が True）
+    """
+
+    # テーブル名 -> (構成変数インデックスのメンバー名, 行のdtype)
+    TABLES = {'edges': ('edge_controls', EDGE_DTYPE), 'sepsets': ('sepset_members', SEPSET_DTYPE)}
+
+    def __init__(self, path: str, variables: list, chunk_size: int = 65536):
+        self.zf = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.index = {v: i for i, v in enumerate(variables)}
+        self.chunk_size = chunk_size
+        self.n_edges = 0
+        self.n_sepsets = 0
+        self._chunk_counts = defaultdict(int)
+        # テーブルごとに独立したバッファ（行, 構成変数インデックス）を持つため、書き出しの順序は問わない
+        self._buffers = {table: ([], []) for table in self.TABLES}
+        self._write_array('variables.npy', np.array([str(v) for v in variables]))
+
+    def _write_array(self, name: str, arr: np.ndarray):
+        with self.zf.open(name, 'w', force_zip64=True) as f:
+            np.lib.format.write_array(f, arr, allow_pickle=False)
+
+    def _append(self, table: str, row: tuple, members: list):
+        rows, buf = self._buffers[table]
+        rows.append(row + (len(buf), len(members)))
+        buf.extend(self.index[m] for m in members)
+        if len(rows) >= self.chunk_size:
+            self._flush(table)
+
+    def _flush(self, table: str):
+        rows, buf = self._buffers[table]
+        if not rows: return
+        members_name, dtype = self.TABLES[table]
+        chunk_id = self._chunk_counts[table]
+        self._write_array(f'{table}/{chunk_id:06d}.npy', np.array(rows, dtype=dtype))
+        self._write_array(f'{members_name}/{chunk_id:06d}.npy', np.array(buf, dtype='<i4'))
+        self._chunk_counts[table] += 1
+        self._buffers[table] = ([], [])
+
+    def add_edge(self, u: str, arrow: str, v: str, strength: float, p_value: float, controls: list, tested: bool = True):
+        self._append('edges', (self.index[u], self.index[v], DIRECTION_CODES[arrow], strength, p_value, tested), controls)
+        self.n_edges += 1
+
+    def write_sepsets(self, sepsets: dict, sepset_pvals: dict):
+        """分離集合を書き出す。ペア (x, y) が複数の分離集合を持つ場合は集合ごとに1行とする。"""
+        for (x, y), sets in sorted(sepsets.items()):
+            p_val = sepset_pvals.get((x, y), float('nan'))
+            for s in sets:
+                self._append('sepsets', (self.index[x], self.index[y], p_val), s)
+                self.n_sepsets += 1
+
+    def close(self, report: dict = None):
+        """残りの行と実行レポートを書き出してファイルを閉じる"""
+        for table in self.TABLES:
+            self._flush(table)
+        report = dict(report or {}, n_edges=self.n_edges, n_sepsets=self.n_sepsets)
+        self.zf.writestr('report.json', json.dumps(report, ensure_ascii=False))
+        self.zf.close()
+
+class CompactResultReader:
+    """
+    CompactResultWriter で書き出した .npz を遅延読み込みするリーダー。
+    メンバーは要求されたときにチャンク単位で読み込むため、全体を一度に展開しない。
+    """
+
+    def __init__(self, path: str):
+        self.zf = zipfile.ZipFile(path, 'r')
+        self.variables = self._read_array('variables.npy')
+
+    def _read_array(self, name: str):
+        with self.zf.open(name) as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+
+    def _chunk_names(self, table: str):
+        return sorted(n for n in self.zf.namelist() if n.startswith(f'{table}/'))
+
+    @property
+    def report(self):
+        return json.loads(self.zf.read('report.json').decode('utf-8'))
+
+    def iter_edge_chunks(self):
+        """(辺テーブル, 統制変数インデックス配列) をチャンクごとに返す"""
+        for name in self._chunk_names('edges'):
+            yield self._read_array(name), self._read_array('edge_controls/' + name.split('/', 1)[1])
+
+    def iter_edges(self):
+        """
+        辺を1本ずつ、JSON出力と同じ形式の辞書として返す。
+        JSON出力と同様に、骨格発見が予算切れで打ち切られた場合のみ「検定完了」を含める
+        （実行レポートに budget_exhausted がない場合は常に含める）。
+        """
+        arrows = {code: arrow for arrow, code in DIRECTION_CODES.items()}
+        with_tested = self.report.get('budget_exhausted', True)
+        for edges, controls in self.iter_edge_chunks():
+            for row in edges:
+                ctrl = controls[row['controls_offset']:row['controls_offset'] + row['controls_len']]
+                record = {
+                    "変数1": str(self.variables[row['u']]), "向き": arrows[int(row['direction'])], "変数2": str(self.variables[row['v']]),
+                    "偏相関係数": float(row['strength']), "p値": float(row['p_value']),
+                    "統制変数群": [str(self.variables[c]) for c in ctrl],
+                }
+                if with_tested:
+                    record["検定完了"] = bool(row['tested'])
+                yield record
+
+    def iter_sepsets(self):
+        """分離集合を ((x, y), 分離集合, p値) として1件ずつ返す"""
+        for name in self._chunk_names('sepsets'):
+            rows, members = self._read_array(name), self._read_array('sepset_members/' + name.split('/', 1)[1])
+            for row in rows:
+                s = members[row['members_offset']:row['members_offset'] + row['members_len']]
+                yield (str(self.variables[row['x']]), str(self.variables[row['y']])), [str(self.variables[z]) for z in s], float(row['p_value'])
+
+    def close(self):
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_compact_results(path: str):
+    """コンパクト形式の分析結果を遅延読み込み用に開く"""
+    return CompactResultReader(path)
 
 # --- 実行ブロック ---
 
-def run_directed_analysis(input_csv_path: str, significance_level: float = 0.05, max_control_vars: int = 4, output_json_path: str = None):
+def run_directed_analysis(input_csv_path: str, significance_level: float = 0.05, max_control_vars: int = 4, output_json_path: str = None,
+                          time_budget_sec: float = None, max_ci_tests: int = None, handle_missing: bool = False, output_npz_path: str = None):
     """
     有向グラフ分析を実行するメイン関数。
+    time_budget_sec または max_ci_tests を指定すると、骨格発見を予算内で打ち切り、
+    その時点の骨格から向き付け・強さ計算を行って結果を返す（各辺に検定完了フラグを付与）。
+    time_budget_sec は分析全体の締め切りで、向き付けと強さ計算も締め切りを過ぎた時点で打ち切る。
+    ただし0次の検定は一括計算のため途中では打ち切らない。
+    handle_missing を True にすると、欠損値を含む行を削除せず、ペアワイズ完全な相関行列と
+    検定ごとの有効サンプル数を用いたFisherのz検定で全フェーズを実行する。
 
     Args:
         input_csv_path (str): 分析対象データ（CSV形式）のファイルパス。
         significance_level (float, optional): 統計的検定の有意水準（α）。デフォルトは 0.05。
         max_control_vars (int, optional): 条件付き独立性検定で考慮する最大変数数。デフォルトは 4。
         output_json_path (str, optional): 結果をJSON形式で保存するファイルパス。デフォルトは None。
+        time_budget_sec (float, optional): 分析全体に使える実時間（秒）。分析開始時点から計測。デフォルトは None（無制限）。
+        max_ci_tests (int, optional): 骨格発見で実行する条件付き独立性検定の最大回数。デフォルトは None（無制限）。
+        handle_missing (bool, optional): 欠損値対応モード（ペアワイズ完全な共分散による検定）を使うか。デフォルトは False。
+        output_npz_path (str, optional): 結果をコンパクト形式（整数インデックスの辺テーブル・分離集合・実行レポート）の
+            .npz として保存するファイルパス。load_compact_results で遅延読み込みできる。デフォルトは None。
+    Returns:
+        dict: 分析結果。エラーが発生した場合は None。
+            - skeleton (nx.Graph): 骨格（予算切れの場合はその時点の骨格）
+            - directed_edges (set), undirected_edges (set): 向き付け後のPDAG
+            - strengths (list): 全ての辺の強さ（各要素は tested フラグを持つ）
+            - sepsets (dict), sepset_pvals (dict): 分離集合とそのp値
+            - search_status (dict): 骨格発見の検定回数・経過時間・予算切れの有無・検定未完了の辺
+            - orientation_complete (bool), strengths_complete (bool): 向き付け・強さ計算が締め切りで打ち切られた場合は False
     """
     try:
-        df = pd.read_csv(input_csv_path, encoding='utf-8')
+        deadline = time.monotonic() + time_budget_sec if time_budget_sec is not None else None
+        try:
+            df = pd.read_csv(input_csv_path, encoding='utf-8')
+        except FileNotFoundError:
+            print(f"エラー: ファイル '{input_csv_path}' が見つかりません。パスを確認してください。")
+            return None
         print(f"CSVファイル '{input_csv_path}' の読み込みに成功しました。")
-        
-        # フェーズ1: 骨格発見
-        G, sepsets, sepset_pvals = discover_skeleton(df, significance_level, max_control_vars)
-
-        # フェーズ2: 向き付け
-        final_directed, final_undirected = orient_graph(G, sepsets, sepset_pvals, df, significance_level)
 
-        # フェーズ3: 強さ計算と結果表示
-        calculate_and_summarize(df, final_directed, final_undirected, significance_level, output_json_path)
+        # 出力先の問題で分析後に失敗しないよう、コンパクト形式のファイルは計算の前に作成しておく
+        writer = None
+        if output_npz_path:
+            try:
+                writer = CompactResultWriter(output_npz_path, list(df.columns))
+            except OSError as e:
+                print(f"エラー: 出力ファイル '{output_npz_path}' を作成できません。出力先のパスを確認してください。({e})")
+                return None
+
+        report = {
+            'completed': False, 'input_csv_path': input_csv_path, 'significance_level': significance_level,
+            'max_control_vars': max_control_vars, 'n_samples': len(df), 'n_variables': len(df.columns),
+            'handle_missing': handle_missing, 'time_budget_sec': time_budget_sec, 'max_ci_tests': max_ci_tests,
+        }
+        try:
+            pc_stats = None
+            if handle_missing:
+                pc_stats = compute_pairwise_complete_stats(df)
+                print(f"  - 欠損値対応モード: 欠損セル数 {int(df.isna().sum().sum())} | 有効サンプル数の最小値 {int(pc_stats['n'].min())}")
+
+            # フェーズ1: 骨格発見
+            G, sepsets, sepset_pvals, search_status = discover_skeleton(df, significance_level, max_control_vars, deadline, max_ci_tests, pc_stats)
+            report.update({
+                'ci_tests': search_status['ci_tests'], 'budget_exhausted': search_status['budget_exhausted'],
+                'skeleton_elapsed_sec': search_status['elapsed_sec'],
+                'n_untestable_pairs': len(search_status['untestable_pairs']),
+                'untestable_edges': [list(e) for e in sorted(search_status['untestable_edges'])],
+            })
+
+            # フェーズ2: 向き付け
+            final_directed, final_undirected, orientation_complete = orient_graph(G, sepsets, sepset_pvals, df, significance_level, pc_stats,
+                                                                                search_status['untestable_edges'], deadline)
+            report.update({'orientation_complete': orientation_complete,
+                           'n_directed': len(final_directed), 'n_undirected': len(final_undirected)})
+
+            # フェーズ3: 強さ計算と結果表示
+            strengths, strengths_complete = calculate_and_summarize(df, final_directed, final_undirected, significance_level, output_json_path,
+                                                                    search_status['untested_edges'] if search_status['budget_exhausted'] else None, pc_stats, writer,
+                                                                    deadline)
+            report['strengths_complete'] = strengths_complete
+            if writer is not None:
+                writer.write_sepsets(sepsets, sepset_pvals)
+            report['completed'] = True
+        finally:
+            if writer is not None:
+                # 途中でエラーが発生した場合も書きかけのファイルを閉じるが、completed が False のままなので区別できる
+                writer.close(report)
+        if writer is not None:
+            print(f"\n分析結果が '{output_npz_path}' にコンパクト形式（.npz）で保存されました。")
+
+        if deadline_passed(deadline):
+            print(f"\n警告: 締め切り（{time_budget_sec}秒）を {time.monotonic() - deadline:.1f}秒 超過しました。"
+                  f"（骨格発見完了: {not search_status['budget_exhausted']}, 向き付け完了: {orientation_complete}, 強さ計算完了: {strengths_complete}）")
+
+        return {
+            'skeleton': G, 'directed_edges': final_directed, 'undirected_edges': final_undirected,
+            'strengths': strengths, 'sepsets': sepsets, 'sepset_pvals': sepset_pvals, 'search_status': search_status,
+            'orientation_complete': orientation_complete, 'strengths_complete': strengths_complete,
+        }
 
-    except FileNotFoundError:
-        print(f"エラー: ファイル '{input_csv_path}' が見つかりません。パスを確認してください。")
     except Exception as e:
         print("予期せぬエラーが発生しました。")
         traceback.print_exc()
@@ -455,13 +921,21 @@ def main():
     SIGNIFICANCE_LEVEL = 0.05 #有意水準α
     MAX_CONTROL_VARS = 4 #条件付き独立性検定で考慮する最大変数数
     OUTPUT_JSON_PATH = 'output/causal_analysis_results.json' # 出力ファイル名/パス
+    TIME_BUDGET_SEC = None #骨格発見の制限時間（秒）。None で無制限
+    MAX_CI_TESTS = None #骨格発見で実行する検定の最大回数。None で無制限
+    HANDLE_MISSING = False #欠損値を含むデータをペアワイズ完全な共分散で分析する場合は True
+    OUTPUT_NPZ_PATH = None #コンパクト形式（.npz）の出力ファイル名/パス。None で出力しない
 
     # 分析実行
     run_directed_analysis(
         input_csv_path=INPUT_CSV_PATH,
         significance_level=SIGNIFICANCE_LEVEL,
         max_control_vars=MAX_CONTROL_VARS,
-        output_json_path=OUTPUT_JSON_PATH
+        output_json_path=OUTPUT_JSON_PATH,
+        time_budget_sec=TIME_BUDGET_SEC,
+        max_ci_tests=MAX_CI_TESTS,
+        handle_missing=HANDLE_MISSING,
+        output_npz_path=OUTPUT_NPZ_PATH
     )
 
 if __name__ == '__main__':